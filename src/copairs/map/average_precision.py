@@ -13,14 +13,22 @@ logger = logging.getLogger("copairs")
 
 
 def build_rank_lists(pos_pairs, neg_pairs, pos_sims, neg_sims):
-    labels = np.concatenate(
-        [
-            np.ones(pos_pairs.size, dtype=np.int32),
-            np.zeros(neg_pairs.size, dtype=np.int32),
-        ]
-    )
-    ix = np.concatenate([pos_pairs.ravel(), neg_pairs.ravel()])
-    sim_all = np.concatenate([np.repeat(pos_sims, 2), np.repeat(neg_sims, 2)])
+    num_pos = pos_pairs.size
+    total = num_pos + neg_pairs.size
+
+    labels = np.zeros(total, dtype=np.int32)
+    labels[:num_pos] = 1
+
+    ix = np.empty(total, dtype=pos_pairs.dtype)
+    ix[:num_pos] = pos_pairs.ravel()
+    ix[num_pos:] = neg_pairs.ravel()
+
+    # Each pair contributes its similarity to both of its members
+    sim_all = np.empty(total, dtype=pos_sims.dtype)
+    sim_all[0:num_pos:2] = pos_sims
+    sim_all[1:num_pos:2] = pos_sims
+    sim_all[num_pos::2] = neg_sims
+    sim_all[num_pos + 1 :: 2] = neg_sims
     ix_sort = np.lexsort([1 - sim_all, ix])
     rel_k_list = labels[ix_sort]
     paired_ix, counts = np.unique(ix, return_counts=True)
@@ -61,10 +69,10 @@ def average_precision(
     )
 
     logger.info("Computing positive similarities...")
-    pos_sims = compute.pairwise_cosine(feats, pos_pairs, batch_size)
+    pos_sims = compute.pairwise_cosine_sq(feats, pos_pairs, batch_size)
 
     logger.info("Computing negative similarities...")
-    neg_sims = compute.pairwise_cosine(feats, neg_pairs, batch_size)
+    neg_sims = compute.pairwise_cosine_sq(feats, neg_pairs, batch_size)
 
     logger.info("Building rank lists...")
     paired_ix, rel_k_list, counts = build_rank_lists(
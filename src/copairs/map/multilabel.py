@@ -46,15 +46,21 @@ def build_rank_lists_multi(pos_pairs, pos_sims, pos_counts, negs_for):
         query = np.unique(mpos_pairs)
         neg_sims, neg_counts = negs_for(query)
         neg_ix = np.repeat(query, neg_counts)
-        labels = np.concatenate(
-            [
-                np.ones(mpos_pairs.size, dtype=np.int32),
-                np.zeros(len(neg_sims), dtype=np.int32),
-            ]
-        )
+        num_pos = mpos_pairs.size
+        total = num_pos + len(neg_sims)
+
+        labels = np.zeros(total, dtype=np.int32)
+        labels[:num_pos] = 1
+
+        ix = np.empty(total, dtype=mpos_pairs.dtype)
+        ix[:num_pos] = mpos_pairs.ravel()
+        ix[num_pos:] = neg_ix
 
-        ix = np.concatenate([mpos_pairs.ravel(), neg_ix])
-        sim_all = np.concatenate([np.repeat(mpos_sims, 2), neg_sims])
+        # Each positive pair contributes its similarity to both members
+        sim_all = np.empty(total, dtype=mpos_sims.dtype)
+        sim_all[0:num_pos:2] = mpos_sims
+        sim_all[1:num_pos:2] = mpos_sims
+        sim_all[num_pos:] = neg_sims
         ix_sort = np.lexsort([1 - sim_all, ix])
         rel_k_list = labels[ix_sort]
         _, counts = np.unique(ix, return_counts=True)
@@ -113,10 +119,10 @@ def average_precision(
     neg_pairs = np.unique(neg_pairs, axis=0)
 
     logger.info("Computing positive similarities...")
-    pos_sims = compute.pairwise_cosine(feats, pos_pairs, batch_size)
+    pos_sims = compute.pairwise_cosine_sq(feats, pos_pairs, batch_size)
 
     logger.info("Computing negative similarities...")
-    neg_sims = compute.pairwise_cosine(feats, neg_pairs, batch_size)
+    neg_sims = compute.pairwise_cosine_sq(feats, neg_pairs, batch_size)
 
     logger.info("Computing AP per label...")
     negs_for = create_neg_query_solver(neg_pairs, neg_sims)
@@ -48,3 +48,119 @@ def test_cosine():
     cosine_gt = cosine_naive(feats, pairs)
     cosine = compute.pairwise_cosine(feats, pairs, batch_size)
     assert np.allclose(cosine_gt, cosine)
+
+
+def test_corrcoef_sq():
+    n_samples = 10
+    n_pairs = 20
+    n_feats = 5
+    batch_size = 4
+    feats = rng.uniform(-1, 1, [n_samples, n_feats])
+    pairs = rng.integers(0, n_samples - 1, [n_pairs, 2])
+
+    corr_gt = corrcoef_naive(feats, pairs)
+    corr_sq = compute.pairwise_corr_sq(feats, pairs, batch_size)
+    assert np.allclose(np.sign(corr_gt) * corr_gt**2, corr_sq)
+
+
+def test_cosine_sq():
+    n_samples = 10
+    n_pairs = 20
+    n_feats = 5
+    batch_size = 4
+    feats = rng.uniform(-1, 1, [n_samples, n_feats])
+    pairs = rng.integers(0, n_samples - 1, [n_pairs, 2])
+
+    cosine_gt = cosine_naive(feats, pairs)
+    cosine_sq = compute.pairwise_cosine_sq(feats, pairs, batch_size)
+    assert np.allclose(np.sign(cosine_gt) * cosine_gt**2, cosine_sq)
+
+
+def test_cosine_int8():
+    n_samples = 10
+    n_pairs = 20
+    n_feats = 50
+    batch_size = 4
+    feats = rng.uniform(-1, 1, [n_samples, n_feats])
+    pairs = rng.integers(0, n_samples - 1, [n_pairs, 2])
+
+    cosine_gt = cosine_naive(feats, pairs)
+    cosine_q = compute.pairwise_cosine_int8(feats, pairs, batch_size)
+    assert np.allclose(cosine_gt, cosine_q, atol=1e-2)
+
+
+def test_corrcoef_large():
+    """Test the large-workload dispatch (numba kernel when available)"""
+    n_samples = 50
+    n_pairs = 200
+    n_feats = 400
+    assert n_pairs * n_feats >= compute.NUMBA_MIN_SIZE
+    feats = rng.uniform(0, 1, [n_samples, n_feats])
+    pairs = rng.integers(0, n_samples - 1, [n_pairs, 2])
+
+    corr_gt = corrcoef_naive(feats, pairs)
+    corr = compute.pairwise_corr(feats, pairs)
+    assert np.allclose(corr_gt, corr, atol=1e-5)
+
+
+def test_cosine_large():
+    """Test the large-workload dispatch (numba kernel when available)"""
+    n_samples = 50
+    n_pairs = 200
+    n_feats = 400
+    assert n_pairs * n_feats >= compute.NUMBA_MIN_SIZE
+    feats = rng.uniform(0, 1, [n_samples, n_feats])
+    pairs = rng.integers(0, n_samples - 1, [n_pairs, 2])
+
+    cosine_gt = cosine_naive(feats, pairs)
+    cosine = compute.pairwise_cosine(feats, pairs)
+    assert np.allclose(cosine_gt, cosine, atol=1e-5)
+
+
+def test_degenerate_rows_large():
+    """Degenerate rows score 0 through the large-workload dispatch too"""
+    n_feats = 400
+    feats = rng.uniform(0, 1, [6, n_feats])
+    feats[0] = 1.0
+    feats[1] = 0.0
+    pairs = np.tile([[0, 2], [1, 3], [4, 5]], [60, 1])
+    assert len(pairs) * n_feats >= compute.NUMBA_MIN_SIZE
+
+    corr = compute.pairwise_corr(feats, pairs)
+    assert np.isfinite(corr).all()
+    assert (corr[0::3] == 0).all()
+    assert (corr[1::3] == 0).all()
+    assert (corr[2::3] != 0).all()
+
+    cosine = compute.pairwise_cosine(feats, pairs)
+    assert np.isfinite(cosine).all()
+    assert (cosine[1::3] == 0).all()
+    assert (cosine[0::3] != 0).all()
+    assert (cosine[2::3] != 0).all()
+
+
+def test_degenerate_rows():
+    """Constant and zero rows score 0 instead of nan/inf"""
+    feats = rng.uniform(0, 1, [6, 8])
+    feats[0] = 1.0
+    feats[1] = 0.0
+    pairs = np.array([[0, 2], [1, 3], [0, 1], [4, 5]])
+
+    corr = compute.pairwise_corr(feats, pairs, 2)
+    assert np.isfinite(corr).all()
+    assert (corr[:3] == 0).all()
+
+    cosine = compute.pairwise_cosine(feats, pairs, 2)
+    assert np.isfinite(cosine).all()
+    assert cosine[1] == 0 and cosine[2] == 0
+
+    corr_sq = compute.pairwise_corr_sq(feats, pairs, 2)
+    assert np.isfinite(corr_sq).all()
+    assert (corr_sq[:3] == 0).all()
+
+    cosine_sq = compute.pairwise_cosine_sq(feats, pairs, 2)
+    assert np.isfinite(cosine_sq).all()
+    assert cosine_sq[1] == 0 and cosine_sq[2] == 0
+
+    cosine_q = compute.pairwise_cosine_int8(feats, pairs, 2)
+    assert np.isfinite(cosine_q).all()
@@ -43,19 +43,30 @@ def test_null_sample_nan_vals():
 
 
 def get_naive_pairs(dframe: pd.DataFrame, sameby, diffby):
-    """Compute valid pairs using cross product from pandas"""
-    cross = dframe.reset_index().merge(
-        dframe.reset_index(), how="cross", suffixes=("_x", "_y")
-    )
-    index = True
-    for col in sameby:
-        index = (cross[f"{col}_x"] == cross[f"{col}_y"]) & index
-    for col in diffby:
-        index = (cross[f"{col}_x"] != cross[f"{col}_y"]) & index
-
-    pairs = cross.loc[index, ["index_x", "index_y"]]
-    # remove rows that pair themselves
-    pairs = pairs[pairs["index_x"] != pairs["index_y"]]
+    """Compute valid pairs enumerating row combinations per sameby group"""
+    if sameby:
+        # NaN keys never satisfy equality, groupby drops them
+        groups = dframe.groupby(list(sameby)).indices.values()
+    else:
+        groups = [np.arange(len(dframe))]
+    # factorize codes NaN as -1, which must compare as different
+    diff_codes = [pd.factorize(dframe[col])[0] for col in diffby]
+
+    pairs = []
+    for idx in groups:
+        if len(idx) < 2:
+            continue
+        p0, p1 = np.triu_indices(len(idx), k=1)
+        id_x, id_y = idx[p0], idx[p1]
+        valid = np.ones(len(id_x), dtype=bool)
+        for codes in diff_codes:
+            valid &= (codes[id_x] != codes[id_y]) | (codes[id_x] == -1) | (
+                codes[id_y] == -1
+            )
+        pairs.append(np.stack([id_x[valid], id_y[valid]], axis=1))
+
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=int)
+    pairs = pd.DataFrame(pairs, columns=["index_x", "index_y"])
     pairs = pairs.sort_values(["index_x", "index_y"]).reset_index(drop=True)
     return pairs
 
@@ -65,10 +76,10 @@ def check_naive(dframe, matcher: Matcher, sameby, diffby):
     gt_pairs = get_naive_pairs(dframe, sameby, diffby)
     vals = matcher.get_all_pairs(sameby, diffby)
     vals = sum(vals.values(), [])
-    vals = pd.DataFrame(vals, columns=["index_x", "index_y"])
-    vals = vals.sort_values(["index_x", "index_y"]).reset_index(drop=True)
-    vals = set(vals.apply(frozenset, axis=1))
-    gt_pairs = set(gt_pairs.apply(frozenset, axis=1))
+    vals = np.sort(np.asarray(vals).reshape(-1, 2), axis=1)
+    vals = set(map(tuple, vals.tolist()))
+    gt_pairs = np.sort(gt_pairs.to_numpy(), axis=1)
+    gt_pairs = set(map(tuple, gt_pairs.tolist()))
     assert gt_pairs == vals
 
 
@@ -132,12 +143,16 @@ def test_raise_no_params():
 
 def assert_sameby_diffby(dframe: pd.DataFrame, pairs_dict: dict, sameby, diffby):
     """Assert the pairs are valid"""
+    cols = list(sameby) + list(diffby)
+    values = dframe[cols].to_numpy()
     for _, pairs in pairs_dict.items():
-        for id1, id2 in pairs:
-            for col in sameby:
-                assert dframe.loc[id1, col] == dframe.loc[id2, col]
-            for col in diffby:
-                assert dframe.loc[id1, col] != dframe.loc[id2, col]
+        if not pairs:
+            continue
+        id1, id2 = np.asarray(pairs).T
+        for col in sameby:
+            assert (values[id1, cols.index(col)] == values[id2, cols.index(col)]).all()
+        for col in diffby:
+            assert (values[id1, cols.index(col)] != values[id2, cols.index(col)]).all()
 
 
 def test_simulate_plates_mult_sameby_large():
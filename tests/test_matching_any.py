@@ -43,10 +43,10 @@ def check_naive(dframe, matcher: Matcher, sameby, diffby):
     gt_pairs = get_naive_pairs(dframe, sameby, diffby)
     vals = matcher.get_all_pairs(sameby, diffby)
     vals = sum(vals.values(), [])
-    vals = pd.DataFrame(vals, columns=["index_x", "index_y"])
-    vals = vals.sort_values(["index_x", "index_y"]).reset_index(drop=True)
-    vals = set(vals.apply(frozenset, axis=1))
-    gt_pairs = set(gt_pairs.apply(frozenset, axis=1))
+    vals = np.sort(np.asarray(vals).reshape(-1, 2), axis=1)
+    vals = set(map(tuple, vals.tolist()))
+    gt_pairs = np.sort(gt_pairs[["index_x", "index_y"]].to_numpy(), axis=1)
+    gt_pairs = set(map(tuple, gt_pairs.tolist()))
     assert gt_pairs == vals
 
 